@@ -1,21 +1,73 @@
 #!/usr/bin/env python3
 import os
-import yaml
+import atexit
 import json
 import re
+import threading
+import weakref
+from collections import Counter
 from pathlib import Path
 from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Tuple, Union
+
+from .pattern_index import PatternIndex, load_yaml
+
+_SLUG_NONWORD_RE = re.compile(r'[^\w\s-]')
+_SLUG_DASH_RE = re.compile(r'[-\s]+')
+
+# Buffered metrics lines are written once this many accumulate, after a short delay, or at exit
+_LOG_FLUSH_THRESHOLD = 32
+_LOG_FLUSH_INTERVAL = 5.0
+
+def dump_yaml(data) -> str:
+    """Dump YAML block style, importing PyYAML on first use and preferring its libyaml C dumper"""
+    import yaml
+    return yaml.dump(data, Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper), default_flow_style=False)
+
+def split_frontmatter(text: str) -> Optional[Tuple[str, str]]:
+    """Split '---' delimited frontmatter from the body with a linear scan"""
+    if not text.startswith('---\n'):
+        return None
+    
+    end = text.find('\n---\n', 4)
+    if end == -1:
+        return None
+    
+    return text[4:end], text[end + 5:]
+
+def first_fenced_block(text: str) -> str:
+    """Contents of the first ``` fenced block without its language line; '' when it is never closed"""
+    fenced = text.partition('```')[2].partition('\n')[2]
+    code, closed, _ = fenced.partition('\n```')
+    return code if closed else ''
 
 class PatternFirstAgent(ABC):
     """Base agent that enforces pattern-first generation"""
     
+    __slots__ = (
+        'domain', 'philosophy', 'patterns_dir', '_pattern_cache', '_index',
+        '_metrics_buffer', '_metrics_lock', '_flush_timer', '__weakref__'
+    )
+    
+    # Agents with metrics still to write, flushed together by a single exit hook
+    _live_agents: 'weakref.WeakSet[PatternFirstAgent]' = weakref.WeakSet()
+    
+    philosophy_path = Path(".ai/philosophy.md")
+    # Philosophy text by (absolute path, mtime_ns), shared by every agent class
+    _philosophy_cache: Dict[Tuple[str, int], str] = {}
+    
     def __init__(self, domain: str):
         self.domain = domain
-        self.philosophy = Path(".ai/philosophy.md").read_text()
+        self.philosophy = self._load_philosophy()
         self.patterns_dir = Path(f".ai/patterns/{domain}")
         self.patterns_dir.mkdir(parents=True, exist_ok=True)
+        self._pattern_cache: Dict[str, Tuple[int, int, Dict]] = {}
+        self._index = PatternIndex.shared(self.patterns_dir.parent)
+        self._metrics_buffer: List[str] = []
+        self._metrics_lock = threading.Lock()
+        self._flush_timer: Optional[threading.Timer] = None
+        PatternFirstAgent._live_agents.add(self)
     
     def execute(self, task: str) -> str:
         """Pattern-first execution flow"""
@@ -59,34 +111,60 @@ class PatternFirstAgent(ABC):
         best_match = None
         best_score = 0
         
-        for pattern_file in self.patterns_dir.glob("*.md"):
-            try:
-                pattern = self.parse_pattern_file(pattern_file)
-                pattern_task = pattern.get('metadata', {}).get('task', '').lower()
-                
-                # Calculate match score
-                score = 0
-                task_words = set(task_lower.split())
-                pattern_words = set(pattern_task.split())
-                
-                # Check for exact match
-                if task_lower == pattern_task:
-                    return pattern
-                
-                # Check for word overlap
-                common_words = task_words & pattern_words
-                if common_words:
-                    score = len(common_words) / max(len(task_words), len(pattern_words))
-                
-                # Update best match
-                if score > best_score and score > 0.3:  # Minimum 30% match
-                    best_match = pattern
-                    best_score = score
-                    
-            except Exception:
+        # Saved patterns are named after their task, so try that file first
+        try:
+            pattern = self.load_pattern(os.path.join(self.patterns_dir, self.pattern_filename(task)))
+            if pattern.get('metadata', {}).get('task', '').lower() == task_lower:
+                return pattern
+        except Exception:
+            pass
+        
+        # Score patterns sharing task words, looked up through the index
+        self._index.refresh()
+        
+        # Task words keep their order so ties between equal scores resolve the same way on every run
+        task_words = dict.fromkeys(task_lower.split())
+        candidates = Counter()
+        for word in task_words:
+            candidates.update(self._index.word_index.get(word, ()))
+        
+        for key, common_count in candidates.items():
+            if os.path.dirname(key) != self.domain:
                 continue
+            
+            # Check for exact match
+            if task_lower == self._index.tasks_lower[key]:
+                best_match = key
+                break
+            
+            # Score by word overlap
+            score = common_count / max(len(task_words), self._index.word_counts[key])
+            
+            # Update best match
+            if score > best_score and score > 0.3:  # Minimum 30% match
+                best_match = key
+                best_score = score
         
-        return best_match
+        if best_match is None:
+            return None
+        
+        try:
+            return self.load_pattern(os.path.join(self._index.root, best_match))
+        except Exception:
+            return None
+    
+    @classmethod
+    def _load_philosophy(cls) -> str:
+        """Read philosophy.md once per process, re-reading only when it changes"""
+        path = os.path.abspath(cls.philosophy_path)
+        key = (path, os.stat(path).st_mtime_ns)
+        cache = PatternFirstAgent._philosophy_cache
+        if key not in cache:
+            # Drop this file's stale text before caching the current one
+            for stale in [k for k in cache if k[0] == path]:
+                del cache[stale]
+            cache[key] = Path(path).read_text()
+        return cache[key]
     
     @abstractmethod
     def create_pattern(self, task: str) -> Dict:
@@ -126,9 +204,7 @@ class PatternFirstAgent(ABC):
     def save_pattern(self, pattern: Dict, task: str) -> str:
         """Save pattern to filesystem"""
         # Generate filename
-        filename = re.sub(r'[^\w\s-]', '', task.lower())
-        filename = re.sub(r'[-\s]+', '-', filename)[:50] + '.md'
-        filepath = self.patterns_dir / filename
+        filepath = self.patterns_dir / self.pattern_filename(task)
         
         # Format pattern as markdown
         content = self.format_pattern_markdown(pattern)
@@ -136,46 +212,48 @@ class PatternFirstAgent(ABC):
         # Write to file
         filepath.write_text(content)
         
+        # Keep the sidecar index in sync for readers
+        self._update_index(filepath, pattern.get('metadata', {}))
+        
         return str(filepath)
     
+    def count_patterns(self) -> int:
+        """Number of patterns in this agent's domain, as indexed by find_pattern and save_pattern"""
+        return sum(1 for key in self._index.patterns if os.path.dirname(key) == self.domain)
+    
+    def _update_index(self, filepath: Path, metadata: Dict):
+        """Record saved pattern metadata in .ai/patterns/index.json"""
+        self._index.update(filepath, metadata)
+    
+    def pattern_filename(self, task: str) -> str:
+        """Slugified filename a pattern for this task is saved under"""
+        filename = _SLUG_NONWORD_RE.sub('', task.lower())
+        return _SLUG_DASH_RE.sub('-', filename)[:50] + '.md'
+    
     def format_pattern_markdown(self, pattern: Dict) -> str:
         """Format pattern dictionary as markdown - context first, then code"""
         metadata = pattern.get('metadata', {})
         
         # Add timestamps
-        metadata['created'] = datetime.now().isoformat()
-        metadata['updated'] = datetime.now().isoformat()
+        now = datetime.now().isoformat()
+        metadata['created'] = now
+        metadata['updated'] = now
         metadata['version'] = '1.0.0'
         
-        frontmatter = yaml.dump(metadata, default_flow_style=False)
+        parts = [
+            '---\n',
+            dump_yaml(metadata),
+            '---\n\n# ', str(metadata.get('task', 'Pattern')),
+            '\n\n## Description\n\n', str(pattern.get('description', '')),
+            '\n\n## Setup Instructions\n\n', str(pattern.get('setup', 'No additional setup required.')),
+            '\n\n## Usage\n\n', str(pattern.get('usage', '')),
+            '\n\n## Notes\n\n', str(pattern.get('notes', '')),
+            '\n\n## Code\n\n```', str(pattern.get('language', 'typescript')),
+            '\n', str(pattern.get('code', '')),
+            '\n```\n'
+        ]
         
-        return f"""---
-{frontmatter}---
-
-# {metadata.get('task', 'Pattern')}
-
-## Description
-
-{pattern.get('description', '')}
-
-## Setup Instructions
-
-{pattern.get('setup', 'No additional setup required.')}
-
-## Usage
-
-{pattern.get('usage', '')}
-
-## Notes
-
-{pattern.get('notes', '')}
-
-## Code
-
-```{pattern.get('language', 'typescript')}
-{pattern.get('code', '')}
-```
-"""
+        return ''.join(parts)
     
     def generate_from_pattern(self, pattern: Dict, task: str) -> str:
         """Generate code from pattern"""
@@ -211,63 +289,100 @@ You can create the pattern manually in: {self.patterns_dir}
             'task': task,
             'domain': self.domain,
             'pattern_reused': pattern_reused,
-            'patterns_total': len(list(self.patterns_dir.glob('*.md')))
+            'patterns_total': self.count_patterns()
         }
         
-        metrics_file = Path('.ai/metrics.jsonl')
-        with open(metrics_file, 'a') as f:
-            f.write(json.dumps(metrics) + '\n')
+        with self._metrics_lock:
+            self._metrics_buffer.append(json.dumps(metrics) + '\n')
+            if len(self._metrics_buffer) < _LOG_FLUSH_THRESHOLD:
+                # Long-running servers are stopped by signals, so don't leave lines waiting for exit
+                if self._flush_timer is None:
+                    self._flush_timer = threading.Timer(_LOG_FLUSH_INTERVAL, self.flush_logs)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+                return
+        
+        self.flush_logs()
     
     def log_error(self, error_message: str):
         """Log errors for debugging"""
-        error_log = Path('.ai/errors.log')
-        with open(error_log, 'a') as f:
+        with open('.ai/errors.log', 'a') as f:
             f.write(f"{datetime.now().isoformat()} - {error_message}\n")
     
-    def parse_pattern_file(self, filepath: Path) -> Dict:
+    def flush_logs(self):
+        """Write buffered metrics to disk with a single open and write"""
+        with self._metrics_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            
+            if not self._metrics_buffer:
+                return
+            
+            with open('.ai/metrics.jsonl', 'a') as f:
+                f.writelines(self._metrics_buffer)
+            self._metrics_buffer.clear()
+    
+    @classmethod
+    def _flush_live_agents(cls):
+        """Flush every agent still alive at interpreter exit"""
+        for agent in list(cls._live_agents):
+            agent.flush_logs()
+    
+    def load_pattern(self, filepath: str) -> Dict:
+        """Parse pattern file, reusing the cached result while the file is unchanged"""
+        stat = os.stat(filepath)
+        cached = self._pattern_cache.get(filepath)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        
+        pattern = self.parse_pattern_file(filepath)
+        self._pattern_cache[filepath] = (stat.st_mtime_ns, stat.st_size, pattern)
+        return pattern
+    
+    def parse_pattern_file(self, filepath: Union[str, Path]) -> Dict:
         """Parse pattern file into dictionary"""
-        content = filepath.read_text()
+        with open(filepath) as f:
+            content = f.read()
         
         # Extract frontmatter
-        match = re.match(r'^---\n(.*?)\n---\n(.*)', content, re.DOTALL)
-        if not match:
+        parts = split_frontmatter(content)
+        if not parts:
             return {}
         
-        metadata = yaml.safe_load(match.group(1))
-        body = match.group(2)
+        frontmatter, body = parts
+        metadata = load_yaml(frontmatter)
         
-        # Extract code block
-        code_match = re.search(r'```\w*\n(.*?)\n```', body, re.DOTALL)
-        code = code_match.group(1) if code_match else ''
+        # Index sections by heading in one pass; '## ' lines inside code fences are content, not headings
+        sections = {}
+        heading = None
+        lines = []
+        in_fence = False
+        for line in body.split('\n'):
+            if line.startswith('```'):
+                in_fence = not in_fence
+            elif not in_fence and line.startswith('## '):
+                if heading is not None:
+                    sections.setdefault(heading, '\n'.join(lines).strip())
+                heading = line[3:].strip()
+                lines = []
+                continue
+            lines.append(line)
+        
+        if heading is not None:
+            sections.setdefault(heading, '\n'.join(lines).strip())
         
-        # Extract sections
-        description = self.extract_section(body, 'Description', '## Code')
-        setup = self.extract_section(body, '## Setup Instructions', '## Usage')
-        usage = self.extract_section(body, '## Usage', '## Notes')
-        notes = self.extract_section(body, '## Notes', None)
+        # Take code from the Code section, or from the first fenced block when there is none
+        code = first_fenced_block(sections.get('Code', body))
         
         return {
             'metadata': metadata,
-            'description': description.strip(),
+            'description': sections.get('Description', ''),
             'code': code,
-            'setup': setup.strip(),
-            'usage': usage.strip(),
-            'notes': notes.strip(),
+            'setup': sections.get('Setup Instructions', ''),
+            'usage': sections.get('Usage', ''),
+            'notes': sections.get('Notes', ''),
             'language': metadata.get('language', 'typescript')
         }
-    
-    def extract_section(self, text: str, start: str, end: Optional[str]) -> str:
-        """Extract a section from markdown text"""
-        start_idx = text.find(start)
-        if start_idx == -1:
-            return ''
-        
-        start_idx += len(start)
-        
-        if end:
-            end_idx = text.find(end, start_idx)
-            if end_idx == -1:
-                return text[start_idx:].strip()
-            return text[start_idx:end_idx].strip()
-        
-        return text[start_idx:].strip()
\ No newline at end of file
+
+atexit.register(PatternFirstAgent._flush_live_agents)
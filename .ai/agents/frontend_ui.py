@@ -1,14 +1,15 @@
 #!/usr/bin/env python3
 import sys
 import os
-sys.path.append('.ai')
 
-from agents.base_agent import PatternFirstAgent
+from .base_agent import PatternFirstAgent
 from typing import Dict
 
 class FrontendUIAgent(PatternFirstAgent):
     """Agent for frontend UI components - searches and uses patterns only"""
     
+    __slots__ = ()
+    
     def __init__(self):
         super().__init__('frontend')
     
@@ -1,14 +1,15 @@
 #!/usr/bin/env python3
 import sys
 import os
-sys.path.append('.ai')
 
-from agents.base_agent import PatternFirstAgent
+from .base_agent import PatternFirstAgent
 from typing import Dict
 
 class InfrastructureAgent(PatternFirstAgent):
     """Agent for infrastructure and project setup - searches and uses patterns only"""
     
+    __slots__ = ()
+    
     def __init__(self):
         super().__init__('infrastructure')
     
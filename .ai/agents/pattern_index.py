@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+import os
+import re
+import json
+import mmap
+import tempfile
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+INDEX_FILENAME = 'index.json'
+LOWERED_DIRNAME = '.lowered'
+TOKENS_FILENAME = 'tokens.json'
+
+# Bumped whenever the on-disk layout changes so older indexes are rebuilt
+INDEX_VERSION = 5
+
+_TOKEN_RE = re.compile(r'\w+')
+
+def iter_pattern_files(directory: str, prefix: str = '') -> Iterator[str]:
+    """Yield '/'-joined relative paths of .md files in name order with a recursive scandir walk, skipping dot-directories"""
+    with os.scandir(directory) as it:
+        entries = sorted(it, key=lambda entry: entry.name)
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            if entry.name.startswith('.'):
+                continue
+            yield from iter_pattern_files(entry.path, prefix + entry.name + '/')
+        elif entry.name.endswith('.md') and entry.is_file():
+            yield prefix + entry.name
+
+def write_atomic(path: Union[str, Path], data: bytes):
+    """Write through a uniquely named temp file and rename it into place, so concurrent writers never collide"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # mkstemp creates the file private to its owner; sidecars are as readable as the patterns
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def load_yaml(text: str):
+    """Parse YAML, importing PyYAML on first use and preferring its libyaml C loader"""
+    import yaml
+    return yaml.load(text, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+def read_frontmatter(pattern_file: Union[str, Path]) -> Optional[str]:
+    """Read only the '---' delimited frontmatter, stopping at its closing line"""
+    # Text mode translates CRLF, so hand-written Windows files parse like any other
+    with open(pattern_file) as f:
+        if f.readline().rstrip('\n') != '---':
+            return None
+        
+        lines = []
+        for line in f:
+            if line.rstrip('\n') == '---':
+                return ''.join(lines)
+            lines.append(line)
+    
+    return None
+
+def file_contains(pattern_file: Union[str, Path], query_lower: str, query_re: Optional['re.Pattern[bytes]']) -> bool:
+    """Case-insensitive search of a file; ASCII queries pass query_re to match its bytes through mmap"""
+    with open(pattern_file, 'rb') as f:
+        if query_re is not None:
+            if os.fstat(f.fileno()).st_size == 0:
+                return query_re.search(b'') is not None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return query_re.search(mm) is not None
+        
+        # Non-ASCII queries need Unicode case folding, so decode, stopping at the first matching line
+        if '\n' in query_lower:
+            data = f.read()
+            return not data.isascii() and query_lower in data.decode(errors='replace').lower()
+        
+        # Pure ASCII bytes lowercase to ASCII text, which cannot contain a non-ASCII query
+        for line in f:
+            if not line.isascii() and query_lower in line.decode(errors='replace').lower():
+                return True
+    
+    return False
+
+class PatternIndex:
+    """Sidecar JSON index of pattern metadata; content tokens and lowercased shadow copies live under .lowered/"""
+    
+    # One index per patterns root, so agents and the server in a process share loaded state
+    _shared: Dict[str, 'PatternIndex'] = {}
+    
+    def __init__(self, root: Path = Path(".ai/patterns")):
+        self.root = root
+        self.path = root / INDEX_FILENAME
+        self.tokens_path = root / LOWERED_DIRNAME / TOKENS_FILENAME
+        self.patterns, self.word_index = self.load()
+        self.word_counts = self.count_words(self.word_index)
+        self.tasks_lower = self.lower_tasks(self.patterns)
+        # Content tokens are only loaded by searches that need them
+        self.token_index: Optional[Dict[str, List[str]]] = None
+        self.content_mtimes: Optional[Dict[str, int]] = None
+    
+    @classmethod
+    def shared(cls, root: Path = Path(".ai/patterns"), content: bool = False) -> 'PatternIndex':
+        """The process-wide index for root; content=True also tracks content tokens and shadow copies"""
+        key = os.path.abspath(root)
+        index = cls._shared.get(key)
+        if index is None:
+            index = cls._shared[key] = cls(root)
+        if content:
+            index.load_content()
+        return index
+    
+    @staticmethod
+    def read_json(path: Path) -> Optional[Dict]:
+        """Load a sidecar file written by this version of the index; None when missing, stale or corrupt"""
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data['version'] != INDEX_VERSION:
+                return None
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return data
+    
+    @staticmethod
+    def write_json(path: Path, data: Dict):
+        """Write a sidecar file atomically so readers never see a partial file"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(path, json.dumps(dict(data, version=INDEX_VERSION), indent=2, sort_keys=True).encode())
+    
+    def load(self) -> Tuple[Dict[str, Dict], Dict[str, List[str]]]:
+        """Load index entries keyed by path relative to the patterns root, plus the word index"""
+        data = self.read_json(self.path)
+        try:
+            patterns = data['patterns']
+            word_index = data.get('word_index')
+        except (KeyError, TypeError, AttributeError):
+            return {}, {}
+        
+        if word_index is None:
+            word_index = self.build_word_index(patterns)
+        
+        return patterns, word_index
+    
+    def load_content(self):
+        """Start tracking content tokens, loading those already on disk"""
+        if self.token_index is not None:
+            return
+        
+        data = self.read_json(self.tokens_path)
+        try:
+            self.token_index, self.content_mtimes = data['token_index'], data['mtimes']
+        except (KeyError, TypeError):
+            self.token_index, self.content_mtimes = {}, {}
+    
+    def save(self):
+        """Persist pattern metadata"""
+        self.write_json(self.path, {'patterns': self.patterns, 'word_index': self.word_index})
+    
+    def save_content(self):
+        """Persist content tokens with the mtimes they were read at"""
+        self.write_json(self.tokens_path, {'token_index': self.token_index, 'mtimes': self.content_mtimes})
+    
+    @staticmethod
+    def build_word_index(patterns: Dict[str, Dict]) -> Dict[str, List[str]]:
+        """Map each lowercased task word to the patterns whose task contains it"""
+        word_index = {}
+        for key, entry in patterns.items():
+            task = entry.get('task')
+            if not isinstance(task, str):
+                continue
+            for word in set(task.lower().split()):
+                word_index.setdefault(word, []).append(key)
+        return word_index
+    
+    @staticmethod
+    def count_words(word_index: Dict[str, List[str]]) -> Counter:
+        """Number of distinct task words per pattern"""
+        return Counter(key for keys in word_index.values() for key in keys)
+    
+    @staticmethod
+    def lower_tasks(patterns: Dict[str, Dict]) -> Dict[str, str]:
+        """Lowercased task per pattern, computed once per index change rather than per search"""
+        return {key: str(entry['task']).lower() for key, entry in patterns.items() if entry.get('task') is not None}
+    
+    def reindex_words(self):
+        """Rebuild the word index after pattern entries changed"""
+        self.word_index = self.build_word_index(self.patterns)
+        self.word_counts = self.count_words(self.word_index)
+        self.tasks_lower = self.lower_tasks(self.patterns)
+    
+    def shadow_path(self, key: str) -> str:
+        """Path of a pattern's lowercased shadow copy"""
+        return os.path.join(self.root, LOWERED_DIRNAME, key)
+    
+    def index_content(self, key: str, pattern_file: Union[str, Path]) -> Set[str]:
+        """Write a pattern's lowercased shadow copy and return its distinct word tokens"""
+        # Invalid UTF-8 decodes to U+FFFD so every search path sees the same text
+        try:
+            with open(pattern_file, 'rb') as f:
+                content_lower = f.read().decode(errors='replace').lower()
+        except OSError:
+            self.remove_shadow(key)
+            return set()
+        
+        shadow_path = self.shadow_path(key)
+        try:
+            os.makedirs(os.path.dirname(shadow_path), exist_ok=True)
+            write_atomic(shadow_path, content_lower.encode())
+        except OSError:
+            # A stale shadow must not outlive a failed rewrite; searches fall back to the pattern
+            self.remove_shadow(key)
+        
+        return set(_TOKEN_RE.findall(content_lower))
+    
+    def remove_shadow(self, key: str):
+        """Delete a pattern's shadow copy if there is one"""
+        try:
+            os.remove(self.shadow_path(key))
+        except OSError:
+            pass
+    
+    def shadow_contains(self, key: str, query_lower_bytes: bytes) -> Optional[bool]:
+        """Plain byte search of a pattern's lowercased shadow; None when it has no shadow"""
+        try:
+            f = open(self.shadow_path(key), 'rb')
+        except OSError:
+            return None
+        
+        with f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return not query_lower_bytes
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return mm.find(query_lower_bytes) != -1
+    
+    def content_contains(self, key: str, query_lower: str, query_re: Optional['re.Pattern[bytes]']) -> bool:
+        """Whether a pattern's content contains the query, searching its shadow copy when there is one"""
+        matched = self.shadow_contains(key, query_lower.encode())
+        if matched is None:
+            matched = file_contains(os.path.join(self.root, key), query_lower, query_re)
+        return matched
+    
+    def reindex_tokens(self, stale_keys: Set[str], new_tokens: Dict[str, Set[str]]):
+        """Drop token postings for changed or removed patterns, then add their fresh tokens"""
+        if stale_keys:
+            for token in list(self.token_index):
+                keys = [key for key in self.token_index[token] if key not in stale_keys]
+                if keys:
+                    self.token_index[token] = keys
+                else:
+                    del self.token_index[token]
+        
+        for key, tokens in new_tokens.items():
+            for token in tokens:
+                self.token_index.setdefault(token, []).append(key)
+    
+    def search_tokens(self, query_lower: str) -> List[str]:
+        """Patterns whose content contains query_lower, which must consist of word characters only"""
+        # A run of word characters can only occur inside a single token
+        matches = set()
+        for token, keys in self.token_index.items():
+            if query_lower in token:
+                matches.update(keys)
+        return sorted(matches)
+    
+    def key(self, filepath: Path) -> str:
+        """Index key for a pattern file"""
+        return filepath.relative_to(self.root).as_posix()
+    
+    def make_entry(self, filepath: Union[str, Path], metadata: Optional[Dict], mtime_ns: int) -> Dict:
+        """Build the index entry for a pattern; task is None when there is no frontmatter"""
+        metadata_found = isinstance(metadata, dict)
+        metadata = metadata if metadata_found else {}
+        
+        return {
+            'task': metadata.get('task', '') if metadata_found else None,
+            'domain': os.path.basename(os.path.dirname(filepath)),
+            'complexity': metadata.get('complexity', 0),
+            'tags': metadata.get('tags', []),
+            'mtime_ns': mtime_ns
+        }
+    
+    @staticmethod
+    def read_metadata(pattern_file: Union[str, Path]) -> Optional[Dict]:
+        """Parse a pattern's frontmatter; every process indexes through this one reader"""
+        frontmatter = read_frontmatter(pattern_file)
+        return load_yaml(frontmatter) if frontmatter is not None else None
+    
+    def update(self, filepath: Path, metadata: Dict):
+        """Record a freshly written pattern and persist the index"""
+        key = self.key(filepath)
+        mtime_ns = os.stat(filepath).st_mtime_ns
+        self.patterns[key] = self.make_entry(filepath, metadata, mtime_ns)
+        self.reindex_words()
+        if self.token_index is not None:
+            self.reindex_tokens({key}, {key: self.index_content(key, filepath)})
+            self.content_mtimes[key] = mtime_ns
+        
+        # The pattern itself is already written; an unsaved index is caught up by the next refresh
+        try:
+            self.save()
+            if self.token_index is not None:
+                self.save_content()
+        except OSError:
+            pass
+    
+    def walk_keys(self) -> Iterator[str]:
+        """Index keys of every pattern file under the root; none when the root is missing"""
+        try:
+            yield from iter_pattern_files(os.fspath(self.root))
+        except FileNotFoundError:
+            return
+    
+    def refresh(self, keys: Optional[Iterable[str]] = None) -> bool:
+        """Re-read only patterns whose mtime changed since indexing; returns True if the index changed"""
+        tracking_content = self.token_index is not None
+        seen = set()
+        metadata_changed = False
+        new_tokens = {}
+        
+        # Callers that already walked the patterns directory pass its keys to skip a second walk
+        for key in self.walk_keys() if keys is None else keys:
+            pattern_file = os.path.join(self.root, key)
+            seen.add(key)
+            
+            mtime_ns = os.stat(pattern_file).st_mtime_ns
+            entry = self.patterns.get(key)
+            if not entry or entry.get('mtime_ns') != mtime_ns:
+                try:
+                    metadata = self.read_metadata(pattern_file)
+                except Exception:
+                    metadata = None
+                
+                self.patterns[key] = self.make_entry(pattern_file, metadata, mtime_ns)
+                metadata_changed = True
+            
+            if tracking_content and self.content_mtimes.get(key) != mtime_ns:
+                new_tokens[key] = self.index_content(key, pattern_file)
+                self.content_mtimes[key] = mtime_ns
+        
+        removed = set(self.patterns) - seen
+        for key in removed:
+            del self.patterns[key]
+        
+        if metadata_changed or removed:
+            self.reindex_words()
+            try:
+                self.save()
+            except OSError:
+                pass
+        
+        content_removed = set(self.content_mtimes) - seen if tracking_content else set()
+        for key in content_removed:
+            del self.content_mtimes[key]
+            self.remove_shadow(key)
+        
+        if new_tokens or content_removed:
+            self.reindex_tokens(set(new_tokens) | content_removed, new_tokens)
+            try:
+                self.save_content()
+            except OSError:
+                pass
+        
+        return bool(metadata_changed or removed or new_tokens or content_removed)
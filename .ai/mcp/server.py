@@ -5,9 +5,10 @@ import asyncio
 import json
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Dict, Any, Optional
-import yaml
 import re
 
 # Add parent directory to path for imports
@@ -37,6 +38,28 @@ except ImportError:
 from agents.base_agent import PatternFirstAgent
 from agents.infrastructure import InfrastructureAgent
 from agents.frontend_ui import FrontendUIAgent
+from agents.pattern_index import PatternIndex
+
+# Tasks mentioning any of these go to the infrastructure agent
+_INFRA_RE = re.compile(r'setup|install|deploy|config|nextjs|project')
+
+# Single scan for validate_code; the lookahead reports overlapping markers and
+# lastgroup names the marker found at each position
+_VALIDATE_RE = re.compile(
+    r'(?=(?P<todo>TODO)'
+    r'|(?P<commented_ellipsis>// \.\.\.|# \.\.\.)'
+    r'|(?P<ellipsis>\.\.\.)'
+    r'|(?P<password>(?ai:password))'
+    r'|(?P<pass>pass)'
+    r'|(?P<typescript>(?ai:typescript))'
+    r'|(?P<any>any))'
+)
+
+@lru_cache(maxsize=128)
+def read_text_cached(path: str, mtime_ns: int, size: int) -> str:
+    """Read a file's text; mtime and size are part of the key so edits miss the cache"""
+    with open(path) as f:
+        return f.read()
 
 class PatternFrameworkServer(Server):
     """MCP server that exposes pattern-first framework functionality"""
@@ -46,6 +69,14 @@ class PatternFrameworkServer(Server):
         self.patterns_dir = Path(".ai/patterns")
         self.philosophy_path = Path(".ai/philosophy.md")
         
+        # Load the sidecar index once, shared with the agents; stale entries are re-read on refresh
+        self.index = PatternIndex.shared(self.patterns_dir, content=True)
+        self.refresh_index()
+        
+        # Pre-warm PyYAML only when there are patterns to parse
+        if self.index.patterns:
+            import yaml  # noqa: F401
+        
         # Initialize agents
         self.agents = {
             'infrastructure': InfrastructureAgent(),
@@ -74,49 +105,49 @@ class PatternFrameworkServer(Server):
             ))
         
         # Add all patterns as resources
-        if self.patterns_dir.exists():
-            for pattern_file in self.patterns_dir.rglob("*.md"):
-                relative_path = pattern_file.relative_to(self.patterns_dir)
-                
-                # Try to extract task from frontmatter
-                try:
-                    content = pattern_file.read_text()
-                    match = re.match(r'^---\n(.*?)\n---', content, re.DOTALL)
-                    if match:
-                        metadata = yaml.safe_load(match.group(1))
-                        task = metadata.get('task', pattern_file.stem)
-                    else:
-                        task = pattern_file.stem
-                except:
-                    task = pattern_file.stem
-                
-                resources.append(Resource(
-                    uri=f"pattern-framework://patterns/{relative_path}",
-                    name=str(relative_path),
-                    description=f"Pattern: {task}",
-                    mimeType="text/markdown"
-                ))
+        self.refresh_index()
+        for relative_path, entry in self.index.patterns.items():
+            task = entry['task'] or Path(relative_path).stem
+            
+            resources.append(Resource(
+                uri=f"pattern-framework://patterns/{relative_path}",
+                name=relative_path,
+                description=f"Pattern: {task}",
+                mimeType="text/markdown"
+            ))
         
         return resources
     
+    def refresh_index(self):
+        """Bring the in-memory index up to date with pattern files on disk"""
+        self.index.refresh()
+    
     async def handle_read_resource(self, request: Request) -> str:
         """Read a specific pattern or philosophy"""
         uri = request.params.get("uri")
         
         if uri == "pattern-framework://philosophy":
-            if self.philosophy_path.exists():
-                return self.philosophy_path.read_text()
-            return "Philosophy file not found"
+            try:
+                return self.read_resource_file(self.philosophy_path)
+            except OSError:
+                return "Philosophy file not found"
         
         if uri.startswith("pattern-framework://patterns/"):
             path = uri.replace("pattern-framework://patterns/", "")
-            pattern_path = self.patterns_dir / path
-            if pattern_path.exists():
-                return pattern_path.read_text()
-            return f"Pattern not found: {path}"
+            try:
+                return self.read_resource_file(self.patterns_dir / path)
+            except OSError:
+                # Missing files, and paths running through a file or a symlink loop, are all "not found"
+                return f"Pattern not found: {path}"
         
         raise ValueError(f"Resource not found: {uri}")
     
+    def read_resource_file(self, resource_path: Path) -> str:
+        """Return a resource's text, decoding it again only after the file changes"""
+        key = os.fspath(resource_path)
+        stat = os.stat(key)
+        return read_text_cached(key, stat.st_mtime_ns, stat.st_size)
+    
     async def handle_list_tools(self, request: Request) -> List[Tool]:
         """List available tools"""
         return [
@@ -229,7 +260,7 @@ class PatternFrameworkServer(Server):
         # Determine which agent to use
         task_lower = task.lower()
         
-        if any(keyword in task_lower for keyword in ['setup', 'install', 'deploy', 'config', 'nextjs', 'project']):
+        if _INFRA_RE.search(task_lower):
             agent = self.agents['infrastructure']
         else:
             agent = self.agents['frontend']
@@ -255,34 +286,44 @@ class PatternFrameworkServer(Server):
     async def search_patterns(self, query: str, domain: Optional[str] = None) -> Dict:
         """Search for patterns"""
         results = []
+        query_lower = query.lower()
         
-        search_dirs = [self.patterns_dir / domain] if domain else [self.patterns_dir]
+        # Without a shadow copy, non-ASCII queries need full Unicode case folding, so they decode the file instead
+        query_re = None
+        if query_lower.isascii():
+            query_re = re.compile(re.escape(query_lower.encode()), re.IGNORECASE)
         
-        for search_dir in search_dirs:
-            if not search_dir.exists():
+        self.refresh_index()
+        entries = [
+            (relative_path, entry)
+            for relative_path, entry in self.index.patterns.items()
+            if entry['task'] is not None and (not domain or relative_path.startswith(f"{domain}/"))
+        ]
+        
+        # Check if query matches task, reading content only when it doesn't;
+        # those reads overlap in threads since file I/O releases the GIL
+        unmatched = [relative_path for relative_path, _ in entries if query_lower not in self.index.tasks_lower[relative_path]]
+        content_misses = set()
+        if unmatched:
+            with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+                matches = executor.map(
+                    lambda relative_path: self.pattern_contains(relative_path, query_lower, query_re),
+                    unmatched
+                )
+                content_misses = {relative_path for relative_path, matched in zip(unmatched, matches) if not matched}
+        
+        for relative_path, entry in entries:
+            if relative_path in content_misses:
                 continue
-                
-            for pattern_file in search_dir.rglob("*.md"):
-                content = pattern_file.read_text()
-                
-                # Parse frontmatter
-                match = re.match(r'^---\n(.*?)\n---\n(.*)', content, re.DOTALL)
-                if match:
-                    try:
-                        metadata = yaml.safe_load(match.group(1))
-                        task = metadata.get('task', '')
-                        
-                        # Check if query matches task or content
-                        if query.lower() in task.lower() or query.lower() in content.lower():
-                            results.append({
-                                "path": str(pattern_file.relative_to(self.patterns_dir)),
-                                "task": task,
-                                "domain": pattern_file.parent.name,
-                                "complexity": metadata.get('complexity', 0),
-                                "tags": metadata.get('tags', [])
-                            })
-                    except:
-                        pass
+            
+            task = entry['task']
+            results.append({
+                "path": relative_path,
+                "task": task,
+                "domain": entry['domain'],
+                "complexity": entry['complexity'],
+                "tags": entry['tags']
+            })
         
         return {
             "count": len(results),
@@ -290,6 +331,13 @@ class PatternFrameworkServer(Server):
             "message": f"Found {len(results)} patterns matching '{query}'"
         }
     
+    def pattern_contains(self, relative_path: str, query_lower: str, query_re: Optional['re.Pattern[bytes]']) -> bool:
+        """Whether a pattern's content contains the query; unreadable files never match"""
+        try:
+            return self.index.content_contains(relative_path, query_lower, query_re)
+        except Exception:
+            return False
+    
     async def list_all_patterns(self) -> Dict:
         """List all available patterns organized by domain"""
         patterns_by_domain = {}
@@ -300,27 +348,13 @@ class PatternFrameworkServer(Server):
                 "message": "No patterns directory found"
             }
         
-        for pattern_file in self.patterns_dir.rglob("*.md"):
-            domain = pattern_file.parent.name
-            
-            if domain not in patterns_by_domain:
-                patterns_by_domain[domain] = []
-            
-            # Parse frontmatter to get task
-            try:
-                content = pattern_file.read_text()
-                match = re.match(r'^---\n(.*?)\n---', content, re.DOTALL)
-                if match:
-                    metadata = yaml.safe_load(match.group(1))
-                    task = metadata.get('task', pattern_file.stem)
-                else:
-                    task = pattern_file.stem
-            except:
-                task = pattern_file.stem
+        self.refresh_index()
+        for relative_path, entry in self.index.patterns.items():
+            pattern_path = Path(relative_path)
             
-            patterns_by_domain[domain].append({
-                "file": pattern_file.name,
-                "task": task
+            patterns_by_domain.setdefault(entry['domain'], []).append({
+                "file": pattern_path.name,
+                "task": entry['task'] or pattern_path.stem
             })
         
         return {
@@ -334,12 +368,14 @@ class PatternFrameworkServer(Server):
         errors = []
         warnings = []
         
+        markers = {match.lastgroup for match in _VALIDATE_RE.finditer(code)}
+        
         # Check for incomplete sections
-        if 'TODO' in code:
+        if 'todo' in markers:
             errors.append("Code contains TODO markers")
-        if '...' in code and '// ...' not in code and '# ...' not in code:
+        if 'ellipsis' in markers and 'commented_ellipsis' not in markers:
             errors.append("Code contains placeholder ellipsis")
-        if 'pass' in code and not 'password' in code.lower():
+        if 'pass' in markers and 'password' not in markers:
             warnings.append("Code contains 'pass' statement")
         
         # Check for minimum complexity
@@ -347,7 +383,7 @@ class PatternFrameworkServer(Server):
             errors.append("Code too short to be a complete solution")
         
         # Check for common anti-patterns
-        if 'any' in code and 'typescript' in code.lower():
+        if 'any' in markers and 'typescript' in markers:
             warnings.append("Consider using specific types instead of 'any'")
         
         return {
@@ -359,11 +395,13 @@ class PatternFrameworkServer(Server):
     
     async def get_pattern_instructions(self, task: str, domain: str) -> Dict:
         """Get instructions for creating a new pattern"""
+        file_path = f".ai/patterns/{domain}/{task.lower().replace(' ', '-')}.md"
+        
         return {
             "instructions": f"""
 To create a pattern for: "{task}"
 
-1. Create a new file: .ai/patterns/{domain}/{task.lower().replace(' ', '-')}.md
+1. Create a new file: {file_path}
 
 2. Use this structure:
 
@@ -407,7 +445,7 @@ Additional context, warnings, or considerations
 
 4. Save the file and the pattern will be available for generation
 """,
-            "file_path": f".ai/patterns/{domain}/{task.lower().replace(' ', '-')}.md",
+            "file_path": file_path,
             "domain": domain,
             "task": task
         }
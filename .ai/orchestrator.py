@@ -1,41 +1,84 @@
 #!/usr/bin/env python3
 import sys
 import os
-sys.path.append('.ai')
+import re
+from functools import lru_cache
 
 from pathlib import Path
-from typing import Dict, List, Optional
-import json
-from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
 
-from agents.infrastructure import InfrastructureAgent
-from agents.frontend_ui import FrontendUIAgent
+_WORD_QUERY_RE = re.compile(r'\w+')
+
+def search_with_mmap(query_lower: str, index, pattern_files: List[str]) -> List[str]:
+    """Byte-search lowercased shadow copies in parallel threads, matching a pattern itself when it has no shadow"""
+    from concurrent.futures import ThreadPoolExecutor
+    
+    query_re = None
+    if query_lower.isascii():
+        query_re = re.compile(re.escape(query_lower.encode()), re.IGNORECASE)
+    
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        matches = executor.map(
+            lambda pattern_file: index.content_contains(pattern_file, query_lower, query_re),
+            pattern_files
+        )
+        return [pattern_file for pattern_file, matched in zip(pattern_files, matches) if matched]
+
+def compile_agent_keywords(agent_keywords: Tuple[Tuple[str, Tuple[str, ...]], ...]) -> Tuple[Tuple[str, 're.Pattern[str]'], ...]:
+    """Compile each agent's keywords into one alternation regex, keeping priority order"""
+    return tuple(
+        (agent_name, re.compile('|'.join(map(re.escape, keywords))))
+        for agent_name, keywords in agent_keywords
+    )
 
 class Orchestrator:
     """Coordinates agent selection and multi-agent workflows"""
     
+    # Keywords for agent selection, in priority order
+    _AGENT_KEYWORDS = (
+        ('infrastructure', ('setup', 'install', 'deploy', 'config', 'build', 'nextjs', 'next.js', 'project')),
+        ('frontend_ui', ('component', 'ui', 'button', 'form', 'layout', 'page', 'homepage', 'navigation'))
+    )
+    _AGENT_PATTERNS = compile_agent_keywords(_AGENT_KEYWORDS)
+    
     def __init__(self):
-        self.agents = self.initialize_agents()
+        self._agent_factories = self.agent_factories()
+        self._agents = {}
     
-    def initialize_agents(self) -> Dict:
-        """Initialize all available agents"""
+    def agent_factories(self) -> Dict[str, Callable]:
+        """Constructors for all available agents; agent modules are imported on first use"""
+        def infrastructure():
+            from agents.infrastructure import InfrastructureAgent
+            return InfrastructureAgent()
+        
+        def frontend_ui():
+            from agents.frontend_ui import FrontendUIAgent
+            return FrontendUIAgent()
+        
         return {
-            'infrastructure': InfrastructureAgent(),
-            'frontend_ui': FrontendUIAgent()
+            'infrastructure': infrastructure,
+            'frontend_ui': frontend_ui
         }
     
-    def determine_agent(self, task: str) -> str:
-        """Determine which agent should handle the task"""
-        task_lower = task.lower()
+    def _get_agent(self, agent_name: str):
+        """Return the named agent, constructing it the first time it is needed"""
+        if agent_name not in self._agents:
+            factory = self._agent_factories.get(agent_name)
+            if factory is None:
+                return None
+            self._agents[agent_name] = factory()
         
-        # Keywords for agent selection
-        agent_keywords = {
-            'infrastructure': ['setup', 'install', 'deploy', 'config', 'build', 'nextjs', 'next.js', 'project'],
-            'frontend_ui': ['component', 'ui', 'button', 'form', 'layout', 'page', 'homepage', 'navigation']
-        }
+        return self._agents[agent_name]
+    
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def determine_agent(task: str) -> str:
+        """Determine which agent should handle the task; repeated tasks are answered from a cache"""
+        task_lower = task.lower()
         
-        for agent_name, keywords in agent_keywords.items():
-            if any(keyword in task_lower for keyword in keywords):
+        # Earlier agents take precedence, so the first agent whose regex matches wins
+        for agent_name, pattern in Orchestrator._AGENT_PATTERNS:
+            if pattern.search(task_lower):
                 return agent_name
         
         # Default to frontend for UI tasks
@@ -46,7 +89,7 @@ class Orchestrator:
         agent_name = self.determine_agent(task)
         print(f"\n🔍 Using {agent_name} agent for: {task}\n")
         
-        agent = self.agents.get(agent_name)
+        agent = self._get_agent(agent_name)
         if not agent:
             raise ValueError(f"Agent {agent_name} not found")
         
@@ -100,36 +143,52 @@ Additional context and considerations
     
     def search_patterns(self, query: str) -> List[str]:
         """Search all patterns across all domains"""
-        results = []
         patterns_dir = Path(".ai/patterns")
+        query_lower = query.lower()
         
-        if not patterns_dir.exists():
+        exists, pattern_files = self._walk_patterns(patterns_dir)
+        if not exists:
             return ["No patterns directory found"]
         
-        for pattern_file in patterns_dir.rglob("*.md"):
-            content = pattern_file.read_text()
-            if query.lower() in content.lower():
-                results.append(str(pattern_file.relative_to(patterns_dir)))
+        # Refreshing keeps the token index and the lowercased shadow copies current
+        index = self._get_pattern_index(patterns_dir)
+        index.refresh(pattern_files)
+        
+        # Single-word queries are answered from the token index,
+        # anything else by plain byte search of the shadow copies
+        if _WORD_QUERY_RE.fullmatch(query_lower):
+            results = index.search_tokens(query_lower)
+        else:
+            results = search_with_mmap(query_lower, index, pattern_files)
+            results.sort()
         
         return results if results else ["No patterns found matching query"]
     
+    def _walk_patterns(self, patterns_dir: Path = Path(".ai/patterns")) -> Tuple[bool, List[str]]:
+        """Whether the patterns directory exists, and its pattern files, from one scandir walk"""
+        from agents.pattern_index import iter_pattern_files
+        
+        try:
+            return True, list(iter_pattern_files(str(patterns_dir)))
+        except FileNotFoundError:
+            return False, []
+    
+    def _get_pattern_index(self, patterns_dir: Path):
+        """The process-wide pattern index, tracking content tokens for search"""
+        from agents.pattern_index import PatternIndex
+        return PatternIndex.shared(patterns_dir, content=True)
+    
     def list_patterns(self) -> List[str]:
         """List all available patterns"""
-        patterns_dir = Path(".ai/patterns")
-        
-        if not patterns_dir.exists():
+        exists, patterns = self._walk_patterns()
+        if not exists:
             return ["No patterns directory found"]
         
-        patterns = []
-        for pattern_file in patterns_dir.rglob("*.md"):
-            patterns.append(str(pattern_file.relative_to(patterns_dir)))
-        
         return patterns if patterns else ["No patterns created yet"]
 
-def main():
-    """Main CLI interface"""
-    if len(sys.argv) < 2:
-        print("""
+def usage() -> str:
+    """CLI help text, built only when it is shown"""
+    return """
 Pattern-First Framework Orchestrator
 
 Usage:
@@ -143,7 +202,12 @@ Examples:
   python .ai/orchestrator.py generate "create homepage"
   python .ai/orchestrator.py create "create navigation component"
   python .ai/orchestrator.py search "homepage"
-        """)
+        """
+
+def main():
+    """Main CLI interface"""
+    if len(sys.argv) < 2:
+        print(usage())
         sys.exit(1)
     
     orchestrator = Orchestrator()
@@ -162,15 +226,12 @@ Examples:
     elif command == "search" and len(sys.argv) > 2:
         query = " ".join(sys.argv[2:])
         results = orchestrator.search_patterns(query)
-        print(f"\n📚 Pattern search results for '{query}':")
-        for result in results:
-            print(f"  - {result}")
+        # One write for the whole listing instead of a print per line
+        sys.stdout.write(f"\n📚 Pattern search results for '{query}':\n  - " + "\n  - ".join(results) + "\n")
     
     elif command == "list":
         patterns = orchestrator.list_patterns()
-        print("\n📚 Available patterns:")
-        for pattern in patterns:
-            print(f"  - {pattern}")
+        sys.stdout.write("\n📚 Available patterns:\n  - " + "\n  - ".join(patterns) + "\n")
     
     else:
         print(f"Unknown command: {command}")